@@ -1,10 +1,24 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, NamedTuple, Optional, Union
 from pathlib import Path
 from datetime import datetime
-import json
+from dataclasses import dataclass
+from functools import lru_cache
+import gzip
+import mmap
+import os
+import numpy as np
+import orjson
+
+# Opt-in: on a snapshot this size, compiling the classifier costs more startup time than it saves
+njit = None
+if os.environ.get("NEPSE_NUMBA") == "1":
+    try:
+        from numba import njit
+    except ImportError:
+        print("⚠️ NEPSE_NUMBA is set but numba is not installed, using NumPy")
 
 # -------------------- APP --------------------
 app = FastAPI(
@@ -33,116 +47,346 @@ class StockAnalysis(BaseModel):
     reason: str
     timestamp: str
 
-stocks_db: List[StockAnalysis] = []
+@dataclass
+class StockTable:
+    """Analyzed stocks stored column-wise, one array per field."""
+    symbol: np.ndarray
+    current_price: np.ndarray
+    price_change_percent: np.ndarray
+    volume: np.ndarray
+    volume_spike: np.ndarray
+    risk_code: np.ndarray  # index into RISK_LEVELS
+    pattern_code: np.ndarray  # index into PATTERNS
+    reason: np.ndarray
+    timestamp: str
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def rows(self, idx: np.ndarray) -> List[dict]:
+        """
+        Rows at the given positions, shaped like StockAnalysis.
+        Numeric fields stay NumPy scalars so dumps() writes the float32 values
+        at their own precision (0.95, not 0.949999988).
+        """
+        return [
+            {
+                "symbol": symbol,
+                "current_price": price,
+                "price_change_percent": change,
+                "volume": volume,
+                "volume_spike": spike,
+                "is_suspicious": risk <= 1,
+                "risk_level": RISK_LEVELS[risk],
+                "pattern": PATTERNS[pattern],
+                "reason": reason,
+                "timestamp": self.timestamp,
+            }
+            for symbol, price, change, volume, spike, risk, pattern, reason in zip(
+                self.symbol[idx].tolist(),
+                self.current_price[idx],
+                self.price_change_percent[idx],
+                self.volume[idx],
+                self.volume_spike[idx],
+                self.risk_code[idx].tolist(),
+                self.pattern_code[idx].tolist(),
+                self.reason[idx].tolist(),
+            )
+        ]
+
+    def column(self, field: str, idx: np.ndarray):
+        """One StockAnalysis field at the given positions, for columnar responses."""
+        if field == "is_suspicious":
+            return self.risk_code[idx] <= 1
+        if field == "risk_level":
+            return RISK_LABELS[self.risk_code[idx]].tolist()
+        if field == "pattern":
+            return PATTERN_LABELS[self.pattern_code[idx]].tolist()
+        if field == "timestamp":
+            return [self.timestamp] * len(idx)
+        values = getattr(self, field)[idx]
+        # orjson only serializes numeric NumPy arrays
+        return values.tolist() if values.dtype.kind == "U" else values
 
 # -------------------- LOGIC --------------------
-def detect_pattern(price_change: float, volume_spike: float) -> str:
-    if volume_spike >= 3 and price_change >= 5:
-        return "Potential PUMP"
-    elif volume_spike >= 3 and price_change <= -5:
-        return "Potential DUMP"
-    elif volume_spike >= 2 or abs(price_change) >= 3:
-        return "Unusual Activity"
-    return "Normal Trading"
-
-def determine_risk(price_change: float, volume_spike: float) -> str:
+RISK_LEVELS = ["HIGH", "MEDIUM", "LOW"]
+PATTERNS = ["Potential PUMP", "Potential DUMP", "Unusual Activity", "Normal Trading"]
+# Same labels as arrays, for indexing with a whole code column at once
+RISK_LABELS = np.array(RISK_LEVELS)
+PATTERN_LABELS = np.array(PATTERNS)
+SORT_FIELDS = ["volume_spike", "price_change_percent", "volume"]
+REASONS = [
+    "⚠️ {spike:.1f}x volume, {change:.1f}% move",
+    "Moderate spike: {spike:.1f}x volume, {change:.1f}% change",
+    "Normal trading behavior",
+]
+
+def detect_pattern(price_change: np.ndarray, volume_spike: np.ndarray) -> np.ndarray:
+    """Returns an index into PATTERNS for every stock."""
+    return np.select(
+        [
+            (volume_spike >= 3) & (price_change >= 5),
+            (volume_spike >= 3) & (price_change <= -5),
+            (volume_spike >= 2) | (np.abs(price_change) >= 3),
+        ],
+        [0, 1, 2],
+        default=3,
+    )
+
+def determine_risk(price_change: np.ndarray, volume_spike: np.ndarray) -> np.ndarray:
     """
     Realistic thresholds for distributing risks:
     - HIGH: significant price move + large spike
     - MEDIUM: moderate move/spike
     - LOW: small changes
+    Returns an index into RISK_LEVELS for every stock.
     """
-    if volume_spike >= 3 and abs(price_change) >= 5:
-        return "HIGH"
-    elif volume_spike >= 1.8 or abs(price_change) >= 3:
-        return "MEDIUM"
-    else:
-        return "LOW"
-
-def generate_reason(risk: str, price_change: float, volume_spike: float) -> str:
-    if risk == "HIGH":
-        return f"⚠️ {volume_spike:.1f}x volume, {price_change:.1f}% move"
-    elif risk == "MEDIUM":
-        return f"Moderate spike: {volume_spike:.1f}x volume, {price_change:.1f}% change"
-    return "Normal trading behavior"
-
-def load_nepse_data():
-    from pathlib import Path
-    import json
-    from datetime import datetime
+    abs_change = np.abs(price_change)
+    return np.select(
+        [
+            (volume_spike >= 3) & (abs_change >= 5),
+            (volume_spike >= 1.8) | (abs_change >= 3),
+        ],
+        [0, 1],
+        default=2,
+    )
+
+def _classify_numpy(price_change: np.ndarray, volume: np.ndarray):
+    """Returns (volume_spike, risk index, pattern index) arrays."""
+    # Baseline average volume: assume 20% of current volume
+    avg_volume = np.maximum(volume * 0.2, 1.0)
+    volume_spike = np.round(volume / avg_volume, 2)
+    return (
+        volume_spike,
+        determine_risk(price_change, volume_spike),
+        detect_pattern(price_change, volume_spike),
+    )
+
+def _classify_loop(price_change, volume):
+    """Same rules as _classify_numpy, fused into a single loop for Numba."""
+    n = price_change.shape[0]
+    volume_spike = np.empty(n, np.float64)
+    risk = np.empty(n, np.int8)
+    pattern = np.empty(n, np.int8)
+    for i in range(n):
+        avg_volume = max(volume[i] * 0.2, 1.0)
+        spike = np.round(volume[i] / avg_volume, 2)
+        change = price_change[i]
+        abs_change = abs(change)
+        volume_spike[i] = spike
+
+        if spike >= 3 and abs_change >= 5:
+            risk[i] = 0
+        elif spike >= 1.8 or abs_change >= 3:
+            risk[i] = 1
+        else:
+            risk[i] = 2
 
+        if spike >= 3 and change >= 5:
+            pattern[i] = 0
+        elif spike >= 3 and change <= -5:
+            pattern[i] = 1
+        elif spike >= 2 or abs_change >= 3:
+            pattern[i] = 2
+        else:
+            pattern[i] = 3
+    return volume_spike, risk, pattern
+
+# Compiled loop when NEPSE_NUMBA=1 and numba is installed, NumPy version otherwise.
+# No on-disk cache: numba ties it to the import name (main vs backend.main).
+classify_stocks = njit(_classify_loop) if njit is not None else _classify_numpy
+
+def generate_reason(risk: int, price_change: float, volume_spike: float) -> str:
+    return REASONS[risk].format(spike=volume_spike, change=price_change)
+
+def narrow_volume(vol: np.ndarray) -> np.ndarray:
+    """int32 when every volume fits, otherwise the int64 values unchanged."""
+    limits = np.iinfo(np.int32)
+    if len(vol) and (vol.min() < limits.min or vol.max() > limits.max):
+        return vol
+    return vol.astype(np.int32)
+
+def analyze_stocks(stocks: List[dict]) -> StockTable:
+    n = len(stocks)
+
+    prices = np.fromiter((s.get("closingPrice", 0.0) for s in stocks), dtype=np.float64, count=n)
+    pct = np.fromiter((s.get("percentChange", 0.0) for s in stocks), dtype=np.float64, count=n)
+    vol = np.fromiter((s.get("volume", 0) for s in stocks), dtype=np.int64, count=n)
+
+    spike, risk_idx, pattern_idx = classify_stocks(pct, vol.astype(np.float64))
+
+    reasons = [
+        generate_reason(r, change, volume_spike)
+        for r, change, volume_spike in zip(risk_idx.tolist(), pct.tolist(), spike.tolist())
+    ]
+
+    # Scoring above runs on the float64 source values; storage is quantized
+    return StockTable(
+        symbol=np.array([s.get("stockSymbol", "N/A") for s in stocks], dtype=str),
+        current_price=prices.astype(np.float32),
+        price_change_percent=pct.astype(np.float32),
+        volume=narrow_volume(vol),
+        volume_spike=spike.astype(np.float32),
+        risk_code=risk_idx.astype(np.int8),
+        pattern_code=pattern_idx.astype(np.int8),
+        reason=np.array(reasons, dtype=str),
+        # One analysis timestamp for the whole batch
+        timestamp=datetime.now().isoformat(),
+    )
+
+def load_nepse_data() -> StockTable:
     BASE_DIR = Path(__file__).resolve().parent.parent
     json_path = BASE_DIR / "data" / "nepse_today.json"
     
     if not json_path.exists():
         print(f"❌ File not found: {json_path}")
-        return []
+        return analyze_stocks([])
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        raw = json.load(f)
-    
-    analyzed = []
+    # Hand the mapped bytes straight to orjson, no intermediate str or copy
+    with open(json_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            raw = orjson.loads(view)
     
-    for s in raw["result"]["stocks"]:
-        current_price = s.get("closingPrice", 0.0)
-        price_change = s.get("percentChange", 0.0)
-        volume = s.get("volume", 0)
-        
-        # Baseline average volume: assume 20% of current volume
-        avg_volume = max(volume * 0.2, 1)
-        volume_spike = round(volume / avg_volume, 2)
-        
-        risk = determine_risk(price_change, volume_spike)
-        pattern = detect_pattern(price_change, volume_spike)
-        reason = generate_reason(risk, price_change, volume_spike)
-        
-        analyzed.append(
-            StockAnalysis(
-                symbol=s.get("stockSymbol", "N/A"),
-                current_price=current_price,
-                price_change_percent=price_change,
-                volume=volume,
-                volume_spike=volume_spike,
-                is_suspicious=risk in ["HIGH", "MEDIUM"],
-                risk_level=risk,
-                pattern=pattern,
-                reason=reason,
-                timestamp=datetime.now().isoformat()
-            )
-        )
-    
-    return analyzed
+    return analyze_stocks(raw["result"]["stocks"])
 
 # -------------------- INIT --------------------
 stocks_db = load_nepse_data()
 print(f"✅ Loaded {len(stocks_db)} stocks")
 
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+class Prebuilt(NamedTuple):
+    """Response body serialized once, plus its gzip form when it is large enough."""
+    raw: bytes
+    gz: Optional[bytes]
+
+def prebuild(body: bytes) -> Prebuilt:
+    # Compressed once here instead of on every request
+    return Prebuilt(body, gzip.compress(body, mtime=0) if len(body) >= GZIP_MIN_SIZE else None)
+
+# stocks_db never changes after startup, so serialize the responses once
+_risk_counts = np.bincount(stocks_db.risk_code, minlength=len(RISK_LEVELS)).tolist()
+_STATS_JSON = dumps({
+    "total_stocks": len(stocks_db),
+    "high_risk": _risk_counts[0],
+    "medium_risk": _risk_counts[1],
+    "low_risk": _risk_counts[2],
+})
+
+def _sorted_desc(idx: np.ndarray, column: np.ndarray) -> np.ndarray:
+    # Stable, so equal values keep their listing order
+    return idx[np.argsort(-column[idx], kind="stable")]
+
+# Row positions for every risk filter / sort order served by /stocks, keyed by (risk, sort)
+_VIEWS = {}
+for _code, _risk in enumerate([None, *RISK_LEVELS], start=-1):
+    _idx = np.arange(len(stocks_db)) if _risk is None else np.flatnonzero(stocks_db.risk_code == _code)
+    _VIEWS[(_risk, None)] = _idx
+    for _field in SORT_FIELDS:
+        _VIEWS[(_risk, _field)] = _sorted_desc(_idx, getattr(stocks_db, _field))
+_VIEW_JSON = {k: prebuild(dumps(stocks_db.rows(v))) for k, v in _VIEWS.items()}
+_SYMBOL_UPPER = np.char.upper(stocks_db.symbol)
+
+# Suspicious stocks, biggest movers first
+_SUSPICIOUS = _sorted_desc(np.flatnonzero(stocks_db.risk_code <= 1), stocks_db.price_change_percent)
+_SUSP_JSON = prebuild(dumps(stocks_db.rows(_SUSPICIOUS)))
+
+# /stats and /stocks/suspicious in one response; neither depends on the dashboard filters
+_DASHBOARD_JSON = prebuild(b'{"stats":' + _STATS_JSON + b',"suspicious":' + _SUSP_JSON.raw + b"}")
+
+# Symbol lookup index; built from the end so the first listing of a symbol wins
+_SYMBOL_INDEX = {sym: i for i, sym in reversed(list(enumerate(_SYMBOL_UPPER.tolist())))}
+_SYMBOL_JSON = {
+    sym: dumps(row)
+    for sym, row in zip(_SYMBOL_INDEX, stocks_db.rows(np.fromiter(_SYMBOL_INDEX.values(), dtype=np.intp)))
+}
+
 # -------------------- API --------------------
+def cached_json(body: Union[bytes, Prebuilt], max_age: int, request: Optional[Request] = None) -> Response:
+    """
+    Prebuilt JSON body with a Cache-Control TTL so clients can reuse it.
+    A Prebuilt body goes out in its gzip form when the request accepts gzip.
+    """
+    headers = {"Cache-Control": f"public, max-age={max_age}"}
+    if isinstance(body, Prebuilt):
+        if body.gz is not None:
+            headers["Vary"] = "Accept-Encoding"
+            if request is not None and "gzip" in request.headers.get("accept-encoding", ""):
+                headers["Content-Encoding"] = "gzip"
+                return Response(body.gz, media_type="application/json", headers=headers)
+        body = body.raw
+    return Response(body, media_type="application/json", headers=headers)
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    names = fields.split(",")
+    unknown = [f for f in names if f not in StockAnalysis.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+@lru_cache(maxsize=64)
+def _columnar_view(risk: Optional[str], sort: Optional[str], fields: tuple) -> Prebuilt:
+    # Unfiltered views never change, so each field set is serialized once
+    idx = _VIEWS[(risk, sort)]
+    return prebuild(dumps({f: stocks_db.column(f, idx) for f in fields}))
+
+def stocks_body(
+    risk: Optional[str],
+    search: Optional[str],
+    sort: Optional[str],
+    fields: Optional[List[str]] = None,
+) -> Union[bytes, Prebuilt]:
+    # Unfiltered views are prebuilt; search results are serialized per request
+    if not search:
+        return _columnar_view(risk, sort, tuple(fields)) if fields else _VIEW_JSON[(risk, sort)]
+    idx = _VIEWS[(risk, sort)]
+    idx = idx[np.char.find(_SYMBOL_UPPER[idx], search.upper()) >= 0]
+    if fields:
+        # Columnar: {field: [values, ...]} straight from the table arrays
+        return dumps({f: stocks_db.column(f, idx) for f in fields})
+    return dumps(stocks_db.rows(idx))
+
 @app.get("/")
-def root():
+async def root():
     return {"message": "NEPSE API", "total_stocks": len(stocks_db)}
 
-@app.get("/stocks", response_model=List[StockAnalysis])
-def get_stocks():
-    return stocks_db
+@app.get("/stocks", response_model=None)
+async def get_stocks(
+    request: Request,
+    risk: Optional[Literal["HIGH", "MEDIUM", "LOW"]] = None,
+    search: Optional[str] = None,
+    sort: Optional[Literal["volume_spike", "price_change_percent", "volume"]] = None,
+    fields: Optional[str] = None,
+):
+    return cached_json(stocks_body(risk, search, sort, parse_fields(fields)), max_age=60, request=request)
+
+@app.get("/dashboard", response_model=None)
+async def get_dashboard(request: Request):
+    return cached_json(_DASHBOARD_JSON, max_age=60, request=request)
 
-@app.get("/stocks/suspicious", response_model=List[StockAnalysis])
-def get_suspicious():
-    return [s for s in stocks_db if s.is_suspicious]
+@app.get("/stocks/suspicious", response_model=None)
+async def get_suspicious(request: Request):
+    return cached_json(_SUSP_JSON, max_age=60, request=request)
+
+@app.post("/stocks/batch", response_model=None)
+async def get_stocks_batch(symbols: List[str]):
+    # Unknown symbols are skipped; rows reuse the prebuilt per-symbol bodies
+    found = [_SYMBOL_JSON[k] for k in (sym.upper() for sym in symbols) if k in _SYMBOL_JSON]
+    return Response(b"[" + b",".join(found) + b"]", media_type="application/json")
 
 @app.get("/stocks/{symbol}", response_model=StockAnalysis)
-def get_stock(symbol: str):
-    for s in stocks_db:
-        if s.symbol.upper() == symbol.upper():
-            return s
-    raise HTTPException(status_code=404, detail="Stock not found")
+async def get_stock(symbol: str):
+    body = _SYMBOL_JSON.get(symbol.upper())
+    if body is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    return cached_json(body, max_age=30)
 
 @app.get("/stats")
-def stats():
-    return {
-        "total_stocks": len(stocks_db),
-        "high_risk": len([s for s in stocks_db if s.risk_level == "HIGH"]),
-        "medium_risk": len([s for s in stocks_db if s.risk_level == "MEDIUM"]),
-        "low_risk": len([s for s in stocks_db if s.risk_level == "LOW"]),
-    }
-
+async def stats():
+    return cached_json(_STATS_JSON, max_age=300)
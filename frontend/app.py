@@ -1,6 +1,12 @@
 import streamlit as st
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import orjson
+import time
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
 
 # -------------------- PAGE CONFIG --------------------
 st.set_page_config(
@@ -13,100 +19,144 @@ st.set_page_config(
 # -------------------- BACKEND API --------------------
 API_URL = "http://localhost:8000"
 
+# Seconds to stop calling the backend after a connection failure
+BREAKER_COOLDOWN = 15
+
+# Top suspicious stocks whose analysis is fetched ahead of time
+PREFETCH_COUNT = 9
+
+# CSS badge class for each backend risk level
+RISK_CLASS = {"HIGH": "risk-high", "MEDIUM": "risk-medium", "LOW": "risk-low"}
+
+# Columns shown in the dashboard stock table
+STOCK_TABLE_COLUMNS = (
+    "symbol",
+    "current_price",
+    "price_change_percent",
+    "volume",
+    "volume_spike",
+    "risk_level",
+    "pattern",
+    "reason",
+)
+STOCK_TABLE_FIELDS = ",".join(STOCK_TABLE_COLUMNS)
+
+# Sidebar quick stats: (label, /stats key)
+SIDEBAR_STATS = (
+    ("Total Stocks", "total_stocks"),
+    ("High Risk", "high_risk"),
+    ("Medium Risk", "medium_risk"),
+)
+
+# Dashboard filter and sort choices
+RISK_FILTER_OPTIONS = ("All", "HIGH", "MEDIUM", "LOW")
+SORT_OPTIONS = ("volume_spike", "price_change_percent", "volume")
+
 # -------------------- CUSTOM CSS --------------------
-st.markdown("""
-<style>
-/* BODY */
-body, .main {
-    background-color: #121212;  /* Dark minimal background */
-    color: #e0e0e0;             /* Light text */
-    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-}
-
-/* MAIN HEADER */
-.main-header {
-    background: linear-gradient(135deg, #4f46e5, #6366f1);
-    padding: 2rem;
-    border-radius: 12px;
-    color: #ffffff;
-    margin-bottom: 2rem;
-    text-align: center;
-    box-shadow: 0 6px 15px rgba(0,0,0,0.3);
-}
-
-/* METRIC CARDS */
-.metric-card {
-    background-color: #1f1f2e;
-    padding: 1.5rem;
-    border-radius: 12px;
-    box-shadow: 0 4px 12px rgba(0,0,0,0.3);
-    border-left: 4px solid #4f46e5;
-    margin: 1rem 0;
-}
-
-/* STOCK CARDS */
-.stock-card {
-    background-color: #1f1f2e;
-    padding: 1rem;
-    border-radius: 10px;
-    box-shadow: 0 2px 6px rgba(0,0,0,0.25);
-    margin: 0.5rem 0;
-}
-
-/* RISK BADGES */
-.risk-high {
-    background-color: #e53935;
-    color: #ffffff;
-    padding: 0.3rem 0.8rem;
-    border-radius: 12px;
-    font-weight: bold;
-}
-.risk-medium {
-    background-color: #ffb300;
-    color: #ffffff;
-    padding: 0.3rem 0.8rem;
-    border-radius: 12px;
-    font-weight: bold;
-}
-.risk-low {
-    background-color: #43a047;
-    color: #ffffff;
-    padding: 0.3rem 0.8rem;
-    border-radius: 12px;
-    font-weight: bold;
-}
-
-/* TABLES */
-[data-testid="stDataFrameContainer"] {
-    background-color: #1f1f2e !important;
-    color: #e0e0e0 !important;
-}
-
-/* SIDEBAR */
-[data-testid="stSidebar"] {
-    background-color: #1b1b24;
-    color: #e0e0e0;
-}
-
-/* HIDE STREAMLIT MENU & FOOTER */
-#MainMenu {visibility: hidden;}
-footer {visibility: hidden;}
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css():
+    # Read once per server process
+    css = (Path(__file__).parent / "style.css").read_text(encoding="utf-8")
+    return f"<style>\n{css}</style>"
+
+# Styles must be sent on every rerun or Streamlit drops them from the page
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # -------------------- API CALL --------------------
-def api_call(endpoint):
+@st.cache_resource
+def get_session():
+    # One keep-alive session shared across reruns
+    session = requests.Session()
+    session.headers.update({"Connection": "keep-alive"})
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_json(endpoint):
+    # Raises on failure so errors are never cached
+    # Fail fast on connect, allow slower reads
+    response = get_session().get(f"{API_URL}{endpoint}", timeout=(2, 10))
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_json(endpoint):
+    return get_json(endpoint)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_analysis(endpoint):
+    # Longer TTL so prefetched entries are still there when the user gets to Analyze
+    return get_json(endpoint)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_dashboard(endpoint):
+    # Card HTML is built once per payload instead of on every rerun
+    bundle = get_json(endpoint)
+    return bundle["stats"], stock_cards_html(bundle["suspicious"], show_spike=True)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_stock_table(endpoint):
+    # Comes back columnar ({column: values}) with only the table columns
+    return pd.DataFrame(get_json(endpoint))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_suspicious_page(endpoint):
+    # Cards are rendered once per payload, not on every rerun
+    stocks = get_json(endpoint)
+    # Likely next stop is Stock Analysis for one of the top movers; runs only on refetch
+    prefetch(f"/stocks/{stock['symbol'].upper()}" for stock in stocks[:PREFETCH_COUNT])
+    return stock_cards_html(stocks)
+
+@st.cache_resource
+def get_executor():
+    # Background threads for cache prefetching
+    return ThreadPoolExecutor(max_workers=4)
+
+def prefetch(endpoints):
+    """Warms the fetch_analysis cache in the background; failures are ignored."""
+    executor = get_executor()
+    for endpoint in endpoints:
+        executor.submit(fetch_analysis, endpoint)
+
+@st.cache_resource
+def get_breaker():
+    # Shared across reruns: skip calls until open_until after a connection failure
+    return {"open_until": 0.0}
+
+def api_call(endpoint, fetch=fetch_json):
+    breaker = get_breaker()
+    if time.monotonic() < breaker["open_until"]:
+        st.error("❌ Cannot connect to backend! Make sure it's running on port 8000")
+        return None
     try:
-        response = requests.get(f"{API_URL}{endpoint}", timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"API Error: {response.status_code}")
-            return None
+        return fetch(endpoint)
+    except requests.exceptions.HTTPError as e:
+        st.error(f"API Error: {e.response.status_code}")
+        return None
     except requests.exceptions.ConnectionError:
+        breaker["open_until"] = time.monotonic() + BREAKER_COOLDOWN
         st.error("❌ Cannot connect to backend! Make sure it's running on port 8000")
         return None
 
+# -------------------- STOCK CARDS --------------------
+def stock_card_html(stock, show_spike=False):
+    risk_class = RISK_CLASS[stock["risk_level"]]
+    spike = f" | Spike: {stock['volume_spike']}x" if show_spike else ""
+    return (
+        f'<div class="stock-card">'
+        f'<h3>{stock["symbol"]} <span class="{risk_class}">{stock["risk_level"]} Risk</span></h3>'
+        f'<p>Price: Rs. {stock["current_price"]:.2f} | '
+        f'Change: {stock["price_change_percent"]:.2f}% | '
+        f'Volume: {stock["volume"]}{spike}</p>'
+        f'<p>{stock["pattern"]} - {stock["reason"]}</p>'
+        f'</div>'
+    )
+
+def stock_cards_html(stocks, show_spike=False):
+    # One markdown element for the whole list instead of one per stock
+    return "\n".join(stock_card_html(stock, show_spike) for stock in stocks)
+
 # -------------------- SIDEBAR --------------------
 with st.sidebar:
     st.markdown("## 📈 NEPSE Detector")
@@ -121,112 +171,82 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### Quick Stats")
 
-    stats = api_call("/stats")
+    suspicious_html = None
+    if page == "🏠 Dashboard":
+        # Stats and the suspicious tab share one request that no filter changes
+        dashboard = api_call("/dashboard", fetch=fetch_dashboard)
+        if dashboard:
+            stats, suspicious_html = dashboard
+        else:
+            stats = None
+    else:
+        stats = api_call("/stats")
     if stats:
-        st.metric("Total Stocks", stats.get("total_stocks", 0))
-        st.metric("High Risk", stats.get("high_risk", 0))
-        st.metric("Medium Risk", stats.get("medium_risk", 0))
-
-# -------------------- DASHBOARD --------------------
-if page == "🏠 Dashboard":
-    st.markdown("""
-    <div class="main-header">
-        <h1>📈 NEPSE Pump & Dump Detection System</h1>
-        <p>Real-time monitoring of Nepal Stock Exchange</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.subheader("📊 Today's Trading Activity")
-
+        # All three metrics as one element
+        st.markdown(
+            "".join(
+                f'<div class="metric-card"><small>{label}</small><h3>{stats.get(key, 0)}</h3></div>'
+                for label, key in SIDEBAR_STATS
+            ),
+            unsafe_allow_html=True,
+        )
+
+# -------------------- PAGE FRAGMENTS --------------------
+# Widgets inside a fragment rerun only the fragment, not the whole script
+
+@st.fragment
+def dashboard_tabs(suspicious_html):
     tab1, tab2 = st.tabs(["All Stocks", "Suspicious Only"])
 
     # -------- ALL STOCKS --------
     with tab1:
-        stocks_data = api_call("/stocks")
-        if stocks_data:
-            df = pd.DataFrame(stocks_data)
+        col1, col2, col3 = st.columns(3)
 
-            col1, col2, col3 = st.columns(3)
+        with col1:
+            risk_filter = st.selectbox("Filter by Risk", RISK_FILTER_OPTIONS)
 
-            with col1:
-                risk_filter = st.selectbox(
-                    "Filter by Risk",
-                    ["All", "HIGH", "MEDIUM", "LOW"]
-                )
+        with col2:
+            search = st.text_input("🔍 Search Symbol").upper()
 
-            with col2:
-                search = st.text_input("🔍 Search Symbol").upper()
+        with col3:
+            sort_by = st.selectbox("Sort by", SORT_OPTIONS)
 
-            with col3:
-                sort_by = st.selectbox(
-                    "Sort by",
-                    ["volume_spike", "price_change_percent", "volume"]
-                )
+        # Filtering and sorting happen in the backend
+        params = {"sort": sort_by, "fields": STOCK_TABLE_FIELDS}
+        if risk_filter != "All":
+            params["risk"] = risk_filter
+        if search:
+            params["search"] = search
 
-            # Filtering
-            if risk_filter != "All":
-                df = df[df["risk_level"] == risk_filter]
-
-            if search:
-                df = df[df["symbol"].str.contains(search, case=False)]
-
-            # Safe Sorting (NO MORE KeyError)
-            if sort_by in df.columns:
-                df = df.sort_values(by=sort_by, ascending=False)
+        # Only the table depends on the filters
+        stocks_df = api_call(f"/stocks?{urlencode(params)}", fetch=fetch_stock_table)
 
+        if stocks_df is not None:
             st.dataframe(
-                df[
-                    [
-                        "symbol",
-                        "current_price",
-                        "price_change_percent",
-                        "volume",
-                        "volume_spike",
-                        "risk_level",
-                        "pattern",
-                        "reason",
-                    ]
-                ],
+                stocks_df,
                 use_container_width=True,
                 height=600,
             )
 
     # -------- SUSPICIOUS ONLY --------
     with tab2:
-        suspicious_data = api_call("/stocks/suspicious")
-        if suspicious_data:
-            for stock in suspicious_data:
-                risk_class = f"risk-{stock['risk_level'].lower()}"
-                st.markdown(f"""
-                <div class="stock-card">
-                    <h3>{stock['symbol']}
-                        <span class="{risk_class}">
-                            {stock['risk_level']} Risk
-                        </span>
-                    </h3>
-                    <p>
-                        Price: Rs. {stock['current_price']:.2f} |
-                        Change: {stock['price_change_percent']:.2f}% |
-                        Volume: {stock['volume']} |
-                        Spike: {stock['volume_spike']}x
-                    </p>
-                    <p>{stock['pattern']} - {stock['reason']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-
-# -------------------- STOCK ANALYSIS --------------------
-elif page == "🔍 Stock Analysis":
-    st.title("🔍 Individual Stock Analysis")
-
-    stock_symbol = st.text_input(
-        "Stock Symbol",
-        placeholder="e.g. NABIL, NICA, ADBL"
-    ).upper()
-
-    if st.button("Analyze") and stock_symbol:
-        analysis = api_call(f"/stocks/{stock_symbol}")
+        if suspicious_html:
+            st.markdown(suspicious_html, unsafe_allow_html=True)
+
+@st.fragment
+def stock_analysis():
+    # Typing in a form doesn't rerun anything until Analyze is pressed
+    with st.form("analyze"):
+        stock_symbol = st.text_input(
+            "Stock Symbol",
+            placeholder="e.g. NABIL, NICA, ADBL"
+        ).upper()
+        submitted = st.form_submit_button("Analyze")
+
+    if submitted and stock_symbol:
+        analysis = api_call(f"/stocks/{stock_symbol}", fetch=fetch_analysis)
         if analysis:
-            risk_class = f"risk-{analysis['risk_level'].lower()}"
+            risk_class = RISK_CLASS[analysis["risk_level"]]
             st.markdown(f"""
             <div class="stock-card">
                 <h2>
@@ -243,30 +263,32 @@ elif page == "🔍 Stock Analysis":
             </div>
             """, unsafe_allow_html=True)
 
+# -------------------- DASHBOARD --------------------
+if page == "🏠 Dashboard":
+    st.markdown("""
+    <div class="main-header">
+        <h1>📈 NEPSE Pump & Dump Detection System</h1>
+        <p>Real-time monitoring of Nepal Stock Exchange</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.subheader("📊 Today's Trading Activity")
+
+    dashboard_tabs(suspicious_html)
+
+# -------------------- STOCK ANALYSIS --------------------
+elif page == "🔍 Stock Analysis":
+    st.title("🔍 Individual Stock Analysis")
+
+    stock_analysis()
+
 # -------------------- SUSPICIOUS STOCKS --------------------
 elif page == "⚠️ Suspicious Stocks":
     st.title("⚠️ Potentially Suspicious Stocks")
 
-    suspicious_data = api_call("/stocks/suspicious")
-    if suspicious_data:
-        for stock in suspicious_data:
-            risk_class = f"risk-{stock['risk_level'].lower()}"
-            st.markdown(f"""
-            <div class="stock-card">
-                <h3>
-                    {stock['symbol']}
-                    <span class="{risk_class}">
-                        {stock['risk_level']} Risk
-                    </span>
-                </h3>
-                <p>
-                    Price: Rs. {stock['current_price']:.2f} |
-                    Change: {stock['price_change_percent']:.2f}% |
-                    Volume: {stock['volume']}
-                </p>
-                <p>{stock['pattern']} - {stock['reason']}</p>
-            </div>
-            """, unsafe_allow_html=True)
+    cards_html = api_call("/stocks/suspicious", fetch=fetch_suspicious_page)
+    if cards_html:
+        st.markdown(cards_html, unsafe_allow_html=True)
 
 # -------------------- FOOTER --------------------
 st.markdown("---")